@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import time
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry and LRU eviction.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 60.0):
+        """
+        Initializes the TTLCache instance.
+        Args:
+            max_size (int): Maximum number of entries kept in memory.
+            ttl (float): Default time-to-live of an entry, in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Retrieves a value from the cache.
+        Args:
+            key (Hashable): The cache key.
+        Returns:
+            Optional[Any]: The cached value, or None if missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores a value, evicting the least recently used entry when full.
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to store.
+            ttl (Optional[float]): Time-to-live in seconds, defaults to the cache TTL.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]],
+            ttl: Optional[float] = None
+        ) -> Any:
+        """
+        Returns the cached value for a key, running the loader on a miss.
+        Concurrent misses on the same key share a single loader call.
+        Args:
+            key (Hashable): The cache key.
+            loader (Callable[[], Awaitable[Any]]): Coroutine function producing the value.
+            ttl (Optional[float]): Time-to-live in seconds, defaults to the cache TTL.
+        Returns:
+            Any: The cached or freshly loaded value.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            # The load runs as its own task so no single caller owns it
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_load(key, done, ttl))
+        # Shield so a cancelled caller does not cancel the shared load
+        return await asyncio.shield(task)
+
+    def _finish_load(self, key: Hashable, task: asyncio.Future, ttl: Optional[float]) -> None:
+        """
+        Stores the result of a completed load and releases its in-flight slot.
+        Args:
+            key (Hashable): The cache key.
+            task (asyncio.Future): The finished loader task.
+            ttl (Optional[float]): Time-to-live in seconds, defaults to the cache TTL.
+        """
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieving the exception also marks it as handled when nobody is waiting
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.set(key, task.result(), ttl)
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache.
+        """
+        self._entries.clear()
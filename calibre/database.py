@@ -1,15 +1,63 @@
-from typing import Optional, List, Dict
+from typing import Optional, Dict, Mapping, Sequence
+from urllib.parse import quote
+import logging
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException
 
+logger = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection. The library is only read, so
+# writes are refused and the page cache / memory map are enlarged; mapped
+# pages live in the OS page cache and are shared by all worker processes.
+# journal_mode is left alone: metadata.db belongs to Calibre and is
+# usually mounted read-only, so switching it to WAL is not an option.
+CONNECTION_PRAGMAS = (
+    "PRAGMA query_only=1",
+    "PRAGMA mmap_size=1073741824",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+STATS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM books) as total_books,
+        (SELECT COUNT(*) FROM authors) as total_authors,
+        (SELECT COUNT(*) FROM publishers) as total_publishers
+"""
+
+# The limit is applied to books before joining the authors, and each book
+# is returned once with all of its authors concatenated.
+SEARCH_QUERY = """
+    SELECT
+        books.id,
+        books.title,
+        GROUP_CONCAT(authors.name, ', ') as author
+    FROM (
+        SELECT books.id, books.title
+        FROM books
+        WHERE 1=1
+        {title_filter}
+        {author_filter}
+        LIMIT :limit
+    ) AS books
+    JOIN books_authors_link ON books.id = books_authors_link.book
+    JOIN authors ON books_authors_link.author = authors.id
+    GROUP BY books.id
+"""
+
+AUTHOR_FILTER = """
+        AND EXISTS (
+            SELECT 1
+            FROM books_authors_link
+            JOIN authors ON books_authors_link.author = authors.id
+            WHERE books_authors_link.book = books.id
+            AND authors.name LIKE :author
+        )
+"""
 
-class DatabaseLockError(Exception):
-    """Custom exception for database lock errors"""
-    pass
 
- 
 class CalibreDatabase:
 
     def __init__(self, library_path: str):
@@ -23,12 +71,54 @@ class CalibreDatabase:
         
         if not os.path.exists(self.db_path):
             raise FileNotFoundError(f"Calibre Database not found in {self.db_path}")
-        print(f"[INFO] Calibre Database found at {self.db_path}")
+        logger.info("Calibre Database found at %s", self.db_path)
         
+        # Apertura in sola lettura tramite URI SQLite (mode=ro)
         self.engine = create_engine(
-            f'sqlite:///{self.db_path}',
+            f'sqlite:///file:{quote(self.db_path)}?mode=ro&uri=true',
             connect_args={'check_same_thread': False}
         )
+        event.listen(self.engine, "connect", self._configure_connection)
+
+        # Apre subito una connessione: verifica che il file sia una libreria
+        # Calibre e lascia nel pool una connessione già configurata
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1 FROM books LIMIT 1"))
+
+        # One prepared statement per combination of filters, keyed by
+        # (has_title, has_author); the title filter is evaluated first.
+        self._search_stmts = {
+            (has_title, has_author): text(SEARCH_QUERY.format(
+                title_filter="AND books.title LIKE :title" if has_title else "",
+                author_filter=AUTHOR_FILTER if has_author else ""
+            ))
+            for has_title in (False, True)
+            for has_author in (False, True)
+        }
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        """
+        Applies the read-only PRAGMAs to a freshly opened SQLite connection.
+        Args:
+            dbapi_connection: The raw sqlite3 connection.
+            connection_record: The pool record owning the connection.
+        """
+        cursor = dbapi_connection.cursor()
+        for pragma in CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    def db_version(self) -> int:
+        """
+        Returns a version of the library that changes whenever Calibre writes to it.
+        Returns:
+            int: The modification time of metadata.db in nanoseconds, or 0 if unavailable.
+        """
+        try:
+            return os.stat(self.db_path).st_mtime_ns
+        except OSError:
+            return 0
 
     def get_database_stats(self) -> Dict:
         """
@@ -38,58 +128,43 @@ class CalibreDatabase:
         """
         try:
             with self.engine.connect() as connection:
-                stats_query = text("""
-                    SELECT 
-                        (SELECT COUNT(*) FROM books) as total_books,
-                        (SELECT COUNT(*) FROM authors) as total_authors,
-                        (SELECT COUNT(*) FROM publishers) as total_publishers
-                """)
-                result = connection.execute(stats_query).first()
-                print(f"[DEBUG] Database stats retrieved: {result}")
-                return {
-                    'total_books': result[0],
-                    'total_authors': result[1],
-                    'total_publishers': result[2]
-                }
+                # Query statica senza parametri: passa direttamente al driver
+                result = connection.exec_driver_sql(STATS_QUERY).mappings().first()
+                logger.debug("Database stats retrieved: %s", result)
+                return dict(result)
         except SQLAlchemyError as e:
-            print(f"[ERROR] Database error: {str(e)}")
+            logger.error("Database error: %s", e)
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
     def search_books(
-            self, 
-            title: Optional[str] = None, 
-            author: Optional[str] = None, 
+            self,
+            title: Optional[str] = None,
+            author: Optional[str] = None,
             limit: int = 100
-        ) -> List[Dict]:
-            try:
-                with self.engine.connect() as connection:
-                    title_filter = "AND books.title LIKE :title" if title else ""
-                    author_filter = "AND authors.name LIKE :author" if author else ""
-                    query = text(f"""
-                        SELECT 
-                            books.id, 
-                            books.title, 
-                            authors.name as author
-                        FROM books
-                        JOIN books_authors_link ON books.id = books_authors_link.book
-                        JOIN authors ON books_authors_link.author = authors.id
-                        WHERE 1=1
-                        {title_filter}
-                        {author_filter}
-                        LIMIT :limit
-                    """)
-    
-                    params = {
-                        'limit': limit,
-                        'title': f'%{title}%' if title else None,
-                        'author': f'%{author}%' if author else None
-                    }
-    
-                    print(f"[DEBUG] Parametri della query SQL: {params}")
-                    result = connection.execute(query, params)
-                    # Usa l'API di SQLAlchemy per ottenere i risultati come dizionari
-                    books = [dict(row._mapping) for row in result]
-                    print(f"[DEBUG] Risultati trovati: {books}")
-                    return books
-            except SQLAlchemyError as e:
-                raise HTTPException(status_code=500, detail=f"Database search error: {str(e)}")
+        ) -> Sequence[Mapping]:
+        """
+        Searches books by title and/or author.
+        Args:
+            title (Optional[str]): Substring to look for in the title.
+            author (Optional[str]): Substring to look for in the author name.
+            limit (int): Maximum number of rows to return.
+        Returns:
+            Sequence[Mapping]: The matching books, one mapping per row.
+        """
+        try:
+            with self.engine.connect() as connection:
+                query = self._search_stmts[(bool(title), bool(author))]
+
+                params = {
+                    'limit': limit,
+                    'title': f'%{title}%' if title else None,
+                    'author': f'%{author}%' if author else None
+                }
+
+                logger.debug("Parametri della query SQL: %s", params)
+                # Le RowMapping sono accettate direttamente dalla validazione Pydantic
+                books = connection.execute(query, params).mappings().all()
+                logger.debug("Risultati trovati: %d", len(books))
+                return books
+        except SQLAlchemyError as e:
+            raise HTTPException(status_code=500, detail=f"Database search error: {str(e)}")
@@ -1,18 +1,34 @@
 from datetime import datetime
+from typing import Optional
+import logging
 import os
 import subprocess
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
+from fastapi.responses import HTMLResponse, ORJSONResponse
 
+from cache import TTLCache
 from database import CalibreDatabase
-from models import LibraryStatsModel, BookModel, BookSearchParams
-from security import TokenManager
+from models import LibraryStatsModel, BookModel
+from security import TokenAuthMiddleware, TokenManager
+
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format="[%(levelname)s] %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 # Configurazioni da variabili d'ambiente
 CALIBRE_LIBRARY_PATH = os.getenv('CALIBRE_LIBRARY_PATH', '/calibre-library')
-print(f"[INFO] CALIBRE_LIBRARY_PATH: {CALIBRE_LIBRARY_PATH}")
+logger.info("CALIBRE_LIBRARY_PATH: %s", CALIBRE_LIBRARY_PATH)
+CACHE_TTL = int(os.getenv('CACHE_TTL', '3600'))
+CACHE_MAX_SIZE = int(os.getenv('CACHE_MAX_SIZE', '256'))
+PROFILING = os.getenv('PROFILING') == '1'
+PREWARM_CACHE = os.getenv('PREWARM_CACHE') == '1'
 
 # Application information
 APP_NAME = "Calibre API"
@@ -20,12 +36,55 @@ APP_VERSION = "1.0.0"
 APP_AUTHOR = "@ilgigante77"
 APP_WEBSITE = "http://example.com"
 
+def _normalize_term(term: Optional[str]) -> Optional[str]:
+    """
+    Rimuove gli spazi superflui da un termine di ricerca; vuoto equivale a nessun filtro.
+    """
+    if term is None:
+        return None
+    return term.strip() or None
+
+
+def _search_cache_key(title: Optional[str], author: Optional[str], limit: int, version: int) -> tuple:
+    """
+    Chiave di cache per una ricerca. I termini ASCII sono portati in minuscolo
+    perché LIKE di SQLite ignora maiuscole/minuscole solo per i caratteri ASCII.
+    """
+    def fold(term):
+        return term.lower() if term and term.isascii() else term
+    return ('book_search', fold(title), fold(author), limit, version)
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title=APP_NAME,
-        description="API per gestione libreria Calibre con autenticazione token"
+        description="API per gestione libreria Calibre con autenticazione token",
+        default_response_class=ORJSONResponse,
+        # Le pagine di documentazione sono servite dalle route protette da token qui sotto
+        docs_url=None,
+        redoc_url=None
     )
 
+    # Profilazione delle richieste con ?profile=1, attiva solo con PROFILING=1.
+    # Registrata per prima così resta all'interno della validazione del token
+    # e profila solo richieste autenticate
+    if PROFILING:
+        from pyinstrument import Profiler
+
+        @app.middleware("http")
+        async def profile_request(request: Request, call_next):
+            if not request.query_params.get("profile"):
+                return await call_next(request)
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            await call_next(request)
+            profiler.stop()
+            return HTMLResponse(profiler.output_html())
+
+    # Validazione del token, registrata prima di CORS così le risposte 403
+    # includono gli header CORS e le richieste preflight non sono bloccate
+    app.add_middleware(TokenAuthMiddleware)
+
     # Configurazione CORS
     app.add_middleware(
         CORSMiddleware,
@@ -33,52 +92,74 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Has-More"],
     )
 
-    # Inizializzazione database Calibre
-    calibre_db = CalibreDatabase(CALIBRE_LIBRARY_PATH)
+    # Compressione delle risposte più grandi di 1 KB (es. liste di libri)
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
-    @app.get("/stats", response_model=LibraryStatsModel)
-    async def get_library_statistics(_: bool=Depends(TokenManager.validate_api_token)):
+    # Cache in memoria dei risultati delle query
+    response_cache = TTLCache(max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL)
+
+    async def cached_library_stats():
         """
-        Endpoint per ottenere le statistiche della libreria.
+        Restituisce le statistiche della libreria, dalla cache se disponibili.
         """
-        print(f"[DEBUG] Richiesta per /statistics")
-
         async def fetch_stats():
-            stats = calibre_db.get_database_stats()
+            stats = await run_in_threadpool(app.state.calibre_db.get_database_stats)
             if not stats:
                 raise HTTPException(status_code=500, detail="Failed to fetch library statistics")
             stats['last_updated'] = datetime.now()
             return stats
 
-        return await fetch_stats()
+        # La versione del database invalida la cache quando Calibre modifica la libreria
+        cache_key = ('library_stats', app.state.calibre_db.db_version())
+        return await response_cache.get_or_load(cache_key, fetch_stats)
+
+    @app.get("/stats", response_model=LibraryStatsModel)
+    async def get_library_statistics():
+        """
+        Endpoint per ottenere le statistiche della libreria.
+        """
+        logger.debug("Richiesta per /stats")
+        return await cached_library_stats()
 
-    @app.get("/books/search", response_model=list[BookModel])
+    @app.get("/books/search", response_model=list[BookModel], response_model_exclude_unset=True)
     async def search_books(
-        params: BookSearchParams=Depends(),
-        _: bool=Depends(TokenManager.validate_api_token)
+        response: Response,
+        title: Optional[str]=Query(None, max_length=200),
+        author: Optional[str]=Query(None, max_length=200),
+        limit: int=Query(100, ge=1, le=1000)
     ):
         """
         Endpoint per la ricerca di libri.
+        L'header X-Has-More indica se esistono altri risultati oltre il limite.
         """
-        print(f"[DEBUG] Richiesta per /books/search con parametri: {params}")
+        logger.debug("Richiesta per /books/search con parametri: title=%s author=%s limit=%s", title, author, limit)
+
+        title = _normalize_term(title)
+        author = _normalize_term(author)
 
         async def search_function():
-            return calibre_db.search_books(
-                title=params.title,
-                author=params.author,
-                limit=params.limit
+            return await run_in_threadpool(
+                app.state.calibre_db.search_books,
+                title=title,
+                author=author,
+                # Un risultato in più per sapere se ce ne sono altri
+                limit=limit + 1
             )
 
-        return await search_function()
+        cache_key = _search_cache_key(title, author, limit, app.state.calibre_db.db_version())
+        books = await response_cache.get_or_load(cache_key, search_function)
+        response.headers["X-Has-More"] = "true" if len(books) > limit else "false"
+        return books[:limit]
 
     @app.get("/docs", include_in_schema=False)
     async def custom_swagger_ui(token: str):
         """
         Endpoint per la documentazione Swagger UI.
         """
-        if token == TokenManager.API_KEY:
+        if TokenManager.check_token(token):
             return get_swagger_ui_html(
                 openapi_url="/openapi.json",
                 title="Calibre Library API"
@@ -90,7 +171,7 @@ def create_app() -> FastAPI:
         """
         Endpoint per la documentazione ReDoc.
         """
-        if token == TokenManager.API_KEY:
+        if TokenManager.check_token(token):
             return get_redoc_html(
                 openapi_url="/openapi.json",
                 title="Calibre Library API"
@@ -103,6 +184,11 @@ def create_app() -> FastAPI:
         Eventi da eseguire all'avvio dell'applicazione.
         """
         TokenManager.init_token()
+        # Inizializzazione database Calibre, una volta per worker
+        app.state.calibre_db = CalibreDatabase(CALIBRE_LIBRARY_PATH)
+        if PREWARM_CACHE:
+            logger.info("Precaricamento delle statistiche nella cache")
+            await cached_library_stats()
 
     return app
 
@@ -112,19 +198,33 @@ app = create_app()
 def system_setup():
     """
     Esegue lo script di configurazione del sistema operativo necessario per il modulo.
+    Lo script viene eseguito una sola volta: un file sentinella ne registra il completamento.
     """
+    sentinel_path = os.path.join(os.path.dirname(__file__), '.setup_done')
+    if os.path.exists(sentinel_path):
+        logger.info("Setup di sistema già eseguito, nessuna azione")
+        return
     script_path = os.path.join(os.path.dirname(__file__), 'setup.sh')
     if os.path.exists(script_path):
-        print(f"[INFO] Esecuzione dello script di setup: {script_path}")
+        logger.info("Esecuzione dello script di setup: %s", script_path)
         subprocess.run(['bash', script_path], check=True)
+        open(sentinel_path, 'w').close()
     else:
         raise FileNotFoundError(f"Il file {script_path} non esiste.")
 
 # Per esecuzione stand-alone
 if __name__ == "__main__":
-    print(f"[INFO] Avvio dell'applicazione {APP_NAME}")
-    print(f"[INFO] Versione: {APP_VERSION}")
-    print(f"[INFO] Autore: {APP_AUTHOR}")
-    print(f"[INFO] Sito web: {APP_WEBSITE}")
+    logger.info("Avvio dell'applicazione %s", APP_NAME)
+    logger.info("Versione: %s", APP_VERSION)
+    logger.info("Autore: %s", APP_AUTHOR)
+    logger.info("Sito web: %s", APP_WEBSITE)
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1)),
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class UserCreate(BaseModel):
@@ -12,7 +12,8 @@ class UserCreate(BaseModel):
     email: str
     password: str = Field(..., min_length=8)
 
-    @validator('email') 
+    @field_validator('email')
+    @classmethod
     def validate_email(cls, v):
         """
         Validatore per l'email. Verifica se l'email contiene il simbolo '@'.
@@ -36,6 +37,8 @@ class BookModel(BaseModel):
     """
     Modello per rappresentare un libro con dettagli opzionali.
     """
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     title: str
     author: str
@@ -47,6 +50,8 @@ class LibraryStatsModel(BaseModel):
     """
     Modello per rappresentare le statistiche della libreria.
     """
+    model_config = ConfigDict(from_attributes=True)
+
     total_books: int = 0
     total_authors: int = 0
     total_publishers: int = 0
@@ -62,7 +67,8 @@ class BookSearchParams(BaseModel):
     tags: Optional[List[str]] = None
     limit: int = 100
 
-    @validator('limit')
+    @field_validator('limit')
+    @classmethod
     def validate_limit(cls, v):
         """
         Validatore per il limite dei risultati della ricerca.
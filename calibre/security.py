@@ -1,12 +1,31 @@
 import configparser
+import hashlib
+import hmac
+import logging
 import os
+import secrets
+from typing import Optional, Union
+from urllib.parse import parse_qsl
 
-from fastapi import Security, HTTPException, status
-from fastapi.security.api_key import APIKeyHeader, APIKeyQuery
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Chiave casuale per processo con cui si calcola il tag dei token:
+# i tag non sono riproducibili al di fuori del processo
+_TOKEN_TAG_KEY = secrets.token_bytes(32)
+
+# Percorsi esclusi dalla validazione: le pagine di documentazione
+# verificano il token da sole, lo schema OpenAPI è pubblico.
+PUBLIC_PATHS = frozenset({"/docs", "/redoc", "/openapi.json"})
+
+logger = logging.getLogger(__name__)
 
 
 class TokenManager:
     API_KEY = None
+    _API_KEY_HASH = None
+    _API_KEY_LEN = None
 
     @classmethod
     def init_token(cls):
@@ -14,44 +33,93 @@ class TokenManager:
         Inizializza il token statico dall'ambiente.
         Deve essere chiamato all'avvio dell'applicazione.
         """
-        print("[INFO] Inizializzazione del token API")
+        logger.info("Inizializzazione del token API")
         cls.API_KEY = load_property('API_TOKEN', None)
 
         if not cls.API_KEY:
-            print(f"[ERROR] API Token deve essere valorizzato")
+            logger.error("API Token deve essere valorizzato")
             raise ValueError("API Token deve essere valorizzato")
-        print(f"[INFO] Token API inizializzato")
+        cls._API_KEY_HASH = cls._hash_token(cls.API_KEY)
+        cls._API_KEY_LEN = len(cls.API_KEY.encode())
+        logger.info("Token API inizializzato")
 
-    @classmethod
-    def validate_api_token(cls,
-        api_key_header: str=Security(APIKeyHeader(name="X-API-Token", auto_error=False)),
-        api_key_query: str=Security(APIKeyQuery(name="api_token", auto_error=False))
-    ):
+    @staticmethod
+    def _hash_token(token: Union[str, bytes]) -> bytes:
         """
-        Valida il token API passato nell'header o nella query string.
+        Calcola il tag BLAKE2b con chiave di un token, a lunghezza fissa (16 byte).
+        I byte grezzi (es. il valore di un header ASGI) sono usati senza conversioni.
         """
-        print(f"[DEBUG] Validazione del token API")
-
-        if not cls.API_KEY:
-            print(f"[ERROR] Token non configurato")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Token non configurato"
-            )
-        # Controlla se il token è nell'header o nella query string
-        api_key = api_key_header or api_key_query
-
-        print(f"[DEBUG] Token ricevuto: {'***' if api_key else 'None'}")
+        if isinstance(token, str):
+            token = token.encode()
+        return hashlib.blake2b(token, digest_size=16, key=_TOKEN_TAG_KEY).digest()
 
-        if not api_key or api_key != cls.API_KEY:
-            print(f"[ERROR] Token non valido: {'***' if api_key else 'None'}")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Token non valido"
-            )
+    @classmethod
+    def check_token(cls, token: Optional[Union[str, bytes]]) -> bool:
+        """
+        Confronta il token ricevuto (str o bytes) con quello configurato in tempo costante.
+        """
+        if not token or cls._API_KEY_HASH is None:
+            return False
+        if isinstance(token, str):
+            token = token.encode()
+        # La lunghezza non è segreta: un token di lunghezza diversa è scartato
+        # subito, senza calcolarne il digest
+        if len(token) != cls._API_KEY_LEN:
+            return False
+        return hmac.compare_digest(cls._hash_token(token), cls._API_KEY_HASH)
+
+
+class TokenAuthMiddleware:
+    """
+    Middleware ASGI che valida il token API passato nell'header X-API-Token
+    o nel parametro api_token, rifiutando la richiesta prima del routing.
+    """
 
-        print(f"[INFO] Token validato con successo")
-        return True
+    # Risposte di errore costruite una sola volta e riusate per ogni richiesta
+    FORBIDDEN = JSONResponse(
+        status_code=status.HTTP_403_FORBIDDEN,
+        content={"detail": "Token non valido"}
+    )
+    NOT_CONFIGURED = JSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": "Token non configurato"}
+    )
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in PUBLIC_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if not TokenManager.API_KEY:
+            logger.error("Token non configurato")
+            await self.NOT_CONFIGURED(scope, receive, send)
+            return
+
+        if not TokenManager.check_token(self._get_token(scope)):
+            logger.debug("Token non valido per %s", scope["path"])
+            await self.FORBIDDEN(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _get_token(scope: Scope) -> Optional[Union[str, bytes]]:
+        """
+        Estrae il token dagli header grezzi o, in mancanza, dalla query string.
+        Un header vuoto equivale a un header assente.
+        """
+        for name, value in scope["headers"]:
+            if name == b"x-api-token" and value:
+                return value
+        query_string = scope.get("query_string")
+        if query_string:
+            for name, value in parse_qsl(query_string.decode("latin-1")):
+                if name == "api_token":
+                    return value
+        return None
 
 
 def load_property(prop_name, default=None):
@@ -71,19 +139,19 @@ def load_property(prop_name, default=None):
     try:
         config = configparser.ConfigParser()
         config.read('/config/calibre.conf')
-        print(f"[DEBUG] Cerco token in file")
+        logger.debug("Cerco token in file")
         # Look for the property in the 'calibre' section
         if 'calibre' in config.sections():
             file_value = config.get('calibre', prop_name.lower(), fallback=default)
-            print(f"[DEBUG] Trovato token in file")
+            logger.debug("Trovato token in file")
             return file_value
     except Exception as e:
-        print(f"Error reading configuration file: {e}")
+        logger.warning("Error reading configuration file: %s", e)
 
     # Step 2: Check environment variables (case-insensitive)
     env_value = os.getenv(prop_name.upper())
     if env_value is not None:
-        print(f"[DEBUG] Trovato token in environment")
+        logger.debug("Trovato token in environment")
         return env_value
 
     # Return default if nothing found